@@ -1,28 +1,18 @@
+import json
+
 import streamlit as st
 import pandas as pd
-import altair as alt
+import numpy as np
 
 # --- Page Setup ---
 st.set_page_config(page_title="DEBUGGER: Find your dream dog to adopt", layout="wide")
 
-# --- Load dataset---
-if "df" not in st.session_state:
-    df = pd.read_csv("data/allDogDescriptions_new.csv")
-    df["contact_state"] = df["contact_state"].str.strip()
-    st.session_state.df = df
-else:
-    df = st.session_state.df
+# --- Category orders ---
+sex_order = ["Female", "Male"]
+age_order = ["Baby", "Young", "Adult", "Senior"]
+size_order = ["Small", "Medium", "Large", "Extra Large"]
 
-# ------ Graph 1: State map for dog availability ------ 
-## Add titles
-st.title("🐶 Find your dream dog to adopt today")
-st.markdown("## 📍 Where do you live?")
-st.markdown("### Click your state to see its top 10 dog breeds in the chart below the map")
-
-## Aggregate the number of imported dogs per state
-dog_state_metric = df.groupby("contact_state")["dog_id"].count().reset_index(name="dog_count")
-
-## Add FIPS codes for merging with topojson 
+# --- FIPS codes for merging with topojson ---
 state_fips = {
     'AL': 1, 'AK': 2, 'AZ': 4, 'AR': 5, 'CA': 6, 'CO': 8, 'CT': 9, 'DE': 10,
     'FL': 12, 'GA': 13, 'HI': 15, 'ID': 16, 'IL': 17, 'IN': 18, 'IA': 19,
@@ -32,242 +22,296 @@ state_fips = {
     'OR': 41, 'PA': 42, 'RI': 44, 'SC': 45, 'SD': 46, 'TN': 47, 'TX': 48,
     'UT': 49, 'VT': 50, 'VA': 51, 'WA': 53, 'WV': 54, 'WI': 55, 'WY': 56
 }
-dog_state_metric["id"] = dog_state_metric["contact_state"].map(state_fips)
-
-## Load US map
-states = alt.topo_feature(
-    'https://cdn.jsdelivr.net/npm/vega-datasets@v1.29.0/data/us-10m.json',
-    'states'
-)
-
-## Selection and map interactivity
-click_state = alt.selection_point(name="Select", fields=["id"])
-opacity = alt.condition(click_state, alt.value(1), alt.value(0.2))
-
-## Draw the map
-chloropleth = alt.Chart(states).mark_geoshape().transform_lookup(
-    lookup='id',
-    from_=alt.LookupData(dog_state_metric, 'id', ['dog_count', 'contact_state'])
-).encode(
-    opacity=opacity,
-    tooltip=[
-        alt.Tooltip('contact_state:N', title='State'),
-        alt.Tooltip('dog_count:Q', title='Num. of Imported Dogs')
-    ]
-).project(
-    type='albersUsa'
-).properties(
-    width=600,
-    height=400
-).add_params(
-    click_state
-)
+fips_state = {v: k for k, v in state_fips.items()}
+
+# --- Load dataset---
+## Built once per process; every session reads the same (read-only) per-state counts, top-10 tables, count cubes and Graph 4 view
+@st.cache_resource(show_spinner=False)
+def load_dogs(path):
+    df = pd.read_csv(
+        path,
+        usecols=[
+            "dog_id", "contact_state", "breed_primary", "age", "sex", "size",
+            "env_children", "env_dogs", "env_cats"
+        ],
+        dtype={
+            "dog_id": "Int32",
+            "contact_state": "string",
+            "breed_primary": "string",
+            "age": "string",
+            "sex": "string",
+            "size": "string",
+            "env_children": "boolean",
+            "env_dogs": "boolean",
+            "env_cats": "boolean"
+        },
+        engine="pyarrow"
+    )
+    df["contact_state"] = df["contact_state"].str.strip().astype("category")
+    df["breed_primary"] = df["breed_primary"].astype("category")
+
+    # Normalize casing once and fix the display order of the trait columns
+    df["sex"] = pd.Categorical(df["sex"].str.title(), categories=sex_order, ordered=True)
+    df["age"] = pd.Categorical(df["age"].str.title(), categories=age_order, ordered=True)
+    df["size"] = pd.Categorical(df["size"].str.title(), categories=size_order, ordered=True)
+
+    # Pack the compatibility answers into one uint8: bit 0 children, 1 dogs, 2 cats, 3 any answer missing
+    env = df[["env_children", "env_dogs", "env_cats"]]
+    answers = env.fillna(False).to_numpy(dtype="uint8")
+    missing = env.isna().any(axis=1).to_numpy(dtype="uint8")
+    df["env_bits"] = answers[:, 0] | answers[:, 1] << 1 | answers[:, 2] << 2 | missing << 3
+
+    # Number of dogs per state, largest first
+    state_counts = (
+        df["contact_state"]
+        .value_counts()
+        .rename_axis("contact_state")
+        .reset_index(name="dog_count")
+        .sort_values("dog_count", ascending=False)
+    )
+
+    # Top 10 breed counts per state (key None = national), among dogs with complete traits
+    core = df.dropna(subset=["breed_primary", "age", "sex", "size", "contact_state"])
+
+    def top10_counts(breeds):
+        # Categorical value_counts() breaks ties alphabetically; keep ties in order of first appearance
+        counts = breeds.astype(object).value_counts(sort=False)
+        return counts.sort_values(ascending=False, kind="stable").head(10)
+
+    top10 = {
+        state: top10_counts(group["breed_primary"])
+        for state, group in core.groupby("contact_state", observed=True)
+    }
+    top10[None] = top10_counts(core["breed_primary"])
+
+    # Dog counts for every observed state/breed/sex/size/age combination
+    cube = core.groupby(["contact_state", "breed_primary", "sex", "size", "age"], observed=True).size()
+    national_cube = cube.groupby(level=["breed_primary", "sex", "size", "age"], observed=True).sum()
+
+    # Dogs that also have all three compatibility answers, for Graph 4
+    compat_df = core[core["env_bits"] < 8]
+    return state_counts, top10, cube, national_cube, compat_df
+
+state_counts, top10, cube, national_cube, compat_df = load_dogs("data/allDogDescriptions_new.csv")
+
+## Top 10 for a state without complete records: empty, so the "No breed data" warnings show
+no_breeds = top10[None].iloc[:0]
+
+# ------ Graph 1: State map for dog availability ------ 
+## Add titles
+st.title("🐶 Find your dream dog to adopt today")
+st.markdown("## 📍 Where do you live?")
+st.markdown("### Click your state to see its top 10 dog breeds in the chart below the map")
+
+## US state shapes (50 states + DC, keyed by FIPS id), read once like the CSV
+@st.cache_data(show_spinner=False)
+def load_us_states(path):
+    with open(path) as f:
+        return json.load(f)
+
+## Build the map spec once; reruns from the breed picker and radios reuse it
+@st.cache_data(show_spinner=False)
+def build_state_map():
+    dog_state_metric = state_counts.copy()
+
+    # Index a FIPS array by category code (0 for non-US codes, which match no map shape)
+    fips_arr = np.array([state_fips.get(c, 0) for c in dog_state_metric["contact_state"].cat.categories], dtype="int32")
+    dog_state_metric["id"] = fips_arr[dog_state_metric["contact_state"].cat.codes.to_numpy()]
+
+    # Only rows with a FIPS code can match a map shape
+    dog_state_metric = dog_state_metric[dog_state_metric["id"] > 0]
+
+    # Join the counts onto the state shapes here rather than with a lookup in the browser
+    counts_by_id = {
+        int(row.id): {"contact_state": str(row.contact_state), "dog_count": int(row.dog_count)}
+        for row in dog_state_metric.itertuples(index=False)
+    }
+    us_states = load_us_states("data/us_states.json")
+    for geometry in us_states["objects"]["states"]["geometries"]:
+        geometry["properties"] = counts_by_id.get(geometry["id"], {})
+
+    # Draw the map (click selects a state)
+    chloropleth = {
+        "data": {"values": us_states, "format": {"type": "topojson", "feature": "states"}},
+        "params": [{"name": "Select", "select": {"type": "point", "fields": ["id"]}}],
+        "mark": "geoshape",
+        "encoding": {
+            "opacity": {"condition": {"param": "Select", "value": 1}, "value": 0.2},
+            "tooltip": [
+                {"field": "properties.contact_state", "type": "nominal", "title": "State"},
+                {"field": "properties.dog_count", "type": "quantitative", "title": "Num. of Imported Dogs"}
+            ]
+        },
+        "projection": {"type": "albersUsa"},
+        "width": 600,
+        "height": 400
+    }
+    return chloropleth
 
 ## Display map
-state_map = st.altair_chart(chloropleth, use_container_width=True, on_select="rerun")
+state_map = st.vega_lite_chart(build_state_map(), width="stretch", on_select="rerun")
 
 # --- Graph 2: Bar Chart - Top 10 breeds in selected state ---
 ## Extract selected FIPS from query params
 selected_fips = state_map.selection.Select[0]['id'] if len(state_map.selection.Select) > 0 else None
 
 ## Convert FIPS to state abbreviation
-fips_state = {v: k for k, v in state_fips.items()}
 selected_state = fips_state.get(int(selected_fips)) if selected_fips else None
 st.session_state.selected_state = selected_state
 
-## Filter dataset
-dog_state_filtered = df[df["contact_state"] == selected_state] if selected_state else df
-
 ## Plot top 10 breeds
 if selected_state:
-    top_breeds = (
-        dog_state_filtered["breed_primary"]
-        .value_counts()
-        .head(10)
-        .reset_index()
-    )
+    top_breeds = top10.get(selected_state, no_breeds).reset_index()
     top_breeds.columns = ["breed", "count"]
 
-    bar_chart = alt.Chart(top_breeds).mark_bar().encode(
-        x=alt.X("count:Q", title="Number of Dogs"),
-        y=alt.Y("breed:N", sort='-x', title="Breed"),
-        tooltip=[alt.Tooltip("breed:N"), alt.Tooltip("count:Q")]
-    ).properties(
-        title=f"Top 10 Dog Breeds in {selected_state}",
-        width=400,
-        height=150
-    )
-
-    st.altair_chart(bar_chart, use_container_width=True)
+    bar_chart = {
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "count", "type": "quantitative", "title": "Number of Dogs"},
+            "y": {"field": "breed", "type": "nominal", "sort": "-x", "title": "Breed"},
+            "tooltip": [
+                {"field": "breed", "type": "nominal"},
+                {"field": "count", "type": "quantitative"}
+            ]
+        },
+        "title": f"Top 10 Dog Breeds in {selected_state}",
+        "width": 400,
+        "height": 150
+    }
+
+    st.vega_lite_chart(top_breeds, bar_chart, width="stretch")
 else:
     st.info("Click a state on the map to explore its top dog breeds.")
     
 # --- Graph 3: Dog breeds and related characteristics ---
-if "df" in st.session_state:
-    df = st.session_state.df
-
-    # Filter missing values
-    df = df.dropna(subset=["breed_primary", "age", "sex", "size", "contact_state"])
-
-    # Get selected state or fallback to national
-    selected_state = st.session_state.get("selected_state", None)
-    state_df = df[df["contact_state"] == selected_state] if selected_state else df
-
-    # Get top breeds
-    top_breeds = (
-        state_df["breed_primary"]
-        .value_counts()
-        .head(10)
-        .index
-        .tolist()
-    )
-
-    st.markdown("## 🐕 What type of dog are you looking for?")
-    st.markdown("### Choose the breed you are interested in")
-
-    state_label = selected_state if selected_state else "None (National)"
-    st.markdown(f"🗺️ Filtering by state: **{state_label}**")
-
-    if not top_breeds:
-        st.warning("No breed data found for the selected state. Please choose a different state.")
-        st.stop()
-
-    selected_breed = st.selectbox("", top_breeds)
-    st.session_state.selected_breed = selected_breed
-
-    # Filter dataset by breed
-    breed_df = state_df[state_df["breed_primary"] == selected_breed]
-
-    # Group and count
-    grouped = (
-        breed_df.groupby(["sex", "size", "age"])
-        .size()
-        .reset_index(name="count")
-    )
-
-    # Set category orders
-    sex_order = ["Female", "Male"]
-    age_order = ["Baby", "Young", "Adult", "Senior"]
-    size_order = ["Small", "Medium", "Large", "Extra Large"]
-
-    grouped["sex"] = pd.Categorical(grouped["sex"], categories=sex_order, ordered=True)
-    grouped["age"] = pd.Categorical(grouped["age"], categories=age_order, ordered=True)
-    grouped["size"] = pd.Categorical(grouped["size"], categories=size_order, ordered=True)
-
-    # Heatmap chart
-    heatmap = alt.Chart(grouped).mark_rect().encode(
-        x=alt.X("age:N", title="Age", sort=age_order),
-        y=alt.Y("size:N", title="Size", sort=size_order),
-        color=alt.Color("count:Q", scale=alt.Scale(scheme='greens'), title="Count"),
-        tooltip=["age:N", "size:N", "count:Q"]
-    ).properties(
-        width=600,
-        height=400
-    )
-
-    final_chart = heatmap.facet(
-        column=alt.Column("sex:N", title=None, sort=sex_order)
-    ).resolve_scale(color="independent")
-
-    st.altair_chart(final_chart, use_container_width=True)
+# Breed/sex/size/age counts for a state (None = national); cached per state, sliced per breed
+@st.cache_resource(show_spinner=False)
+def heat_cube(state):
+    return cube.loc[state] if state else national_cube
+
+# Get selected state or fallback to national
+selected_state = st.session_state.get("selected_state", None)
+
+# Get top breeds
+top_breeds = top10.get(selected_state, no_breeds).index.tolist()
+
+st.markdown("## 🐕 What type of dog are you looking for?")
+st.markdown("### Choose the breed you are interested in")
+
+state_label = selected_state if selected_state else "None (National)"
+st.markdown(f"🗺️ Filtering by state: **{state_label}**")
+
+if not top_breeds:
+    st.warning("No breed data found for the selected state. Please choose a different state.")
+    st.stop()
+
+selected_breed = st.selectbox("", top_breeds)
+st.session_state.selected_breed = selected_breed
+
+# Group and count
+grouped = heat_cube(selected_state).loc[selected_breed].reset_index(name="count")
+
+# Heatmap chart, one panel per sex
+final_chart = {
+    "facet": {"column": {"field": "sex", "type": "nominal", "title": None, "sort": sex_order}},
+    "spec": {
+        "mark": "rect",
+        "encoding": {
+            "x": {"field": "age", "type": "nominal", "title": "Age", "sort": age_order},
+            "y": {"field": "size", "type": "nominal", "title": "Size", "sort": size_order},
+            "color": {"field": "count", "type": "quantitative", "scale": {"scheme": "greens"}, "title": "Count"},
+            "tooltip": [
+                {"field": "age", "type": "nominal"},
+                {"field": "size", "type": "nominal"},
+                {"field": "count", "type": "quantitative"}
+            ]
+        },
+        "width": 600,
+        "height": 400
+    },
+    "resolve": {"scale": {"color": "independent"}}
+}
 
-else:
-    st.warning("Dataset not loaded. Please upload it in the sidebar first.")
+st.vega_lite_chart(grouped, final_chart, width="stretch")
 
 # --- Graph 4: Compatibility by filtered traits ---
-if "df" in st.session_state:
-    df = st.session_state.df
-
-    df = df.dropna(subset=[
-        "breed_primary", "age", "sex", "size",
-        "env_children", "env_dogs", "env_cats", "contact_state"
-    ])
-
-    # Get selected state or national fallback
-    selected_state = st.session_state.get("selected_state", None)
-    df = df[df["contact_state"] == selected_state] if selected_state else df
-
-    # Top breeds
-    top_breeds = df["breed_primary"].value_counts().head(10).index.tolist()
-
-    # Select breed from session or fallback
-    if "selected_breed" in st.session_state:
-        selected_breed = st.session_state.selected_breed
-    elif top_breeds:
-        selected_breed = top_breeds[0]
-    else:
-        selected_breed = None
-
-    # Handle empty fallback
-    if not selected_breed:
-        st.warning("No breed data found for the selected state. Please choose a different state.")
-        st.stop()
-
-    breed_df = df[df["breed_primary"] == selected_breed].copy()
-
-    st.markdown("## 🧩 Will this breed get along with your household?")
-    st.markdown("### Choose age, size, and sex to see how compatible these dogs are with children, cats, and dogs.")
-
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        selected_age = st.radio("Age", ["Baby", "Young", "Adult", "Senior"], horizontal=True)
-    with col2:
-        selected_sex = st.radio("Sex", ["Female", "Male"], horizontal=True)
-    with col3:
-        selected_size = st.radio("Size", ["Small", "Medium", "Large", "Extra Large"], horizontal=True)
-
-    # Standardize
-    breed_df["age"] = breed_df["age"].str.title()
-    breed_df["sex"] = breed_df["sex"].str.title()
-    breed_df["size"] = breed_df["size"].str.title()
-
-    filtered = breed_df[
-        (breed_df["age"] == selected_age) &
-        (breed_df["sex"] == selected_sex) &
-        (breed_df["size"] == selected_size)
-    ]
-
-    if filtered.empty:
-        st.info("No dogs found for the selected combination. Try adjusting age, size, or sex.")
-    else:
-        def count_responses(column, label):
-            mapped = filtered[column].map({True: "Yes", False: "No"})
-            vc = (
-                mapped.value_counts()
-                .reindex(["Yes", "No"], fill_value=0)
-                .reset_index()
-            )
-            vc.columns = ["Response", "Count"]
-            vc["Trait"] = label
-            return vc
-
-        df_children = count_responses("env_children", "Children")
-        df_dogs = count_responses("env_dogs", "Dogs")
-        df_cats = count_responses("env_cats", "Cats")
-
-        df_compat = pd.concat([df_children, df_dogs, df_cats], ignore_index=True)
-
-        state_label = selected_state if selected_state else "the US"
-
-        bar_chart = alt.Chart(df_compat).mark_bar().encode(
-            x=alt.X("Trait:N", title=None),
-            y=alt.Y("Count:Q", title="Number of Dogs"),
-            color=alt.Color("Response:N", title="Compatible", scale=alt.Scale(domain=["Yes", "No"])),
-            tooltip=["Trait", "Response", "Count"]
-        ).properties(
-            width=400,
-            height=400,
-            title=f"Compatibility for {selected_breed} in {state_label} ({selected_age}, {selected_sex}, {selected_size})"
-        )
-
-        st.altair_chart(bar_chart, use_container_width=True)
-
-        st.markdown(
-            "*Note: Each compatibility trait is recorded separately.*"
-        )
-
+# Get selected state or national fallback
+selected_state = st.session_state.get("selected_state", None)
+state_df = compat_df[compat_df["contact_state"] == selected_state] if selected_state else compat_df
+
+# Top breeds
+top_breeds = top10.get(selected_state, no_breeds).index.tolist()
+
+# Select breed from session or fallback
+if "selected_breed" in st.session_state:
+    selected_breed = st.session_state.selected_breed
+elif top_breeds:
+    selected_breed = top_breeds[0]
+else:
+    selected_breed = None
+
+# Handle empty fallback
+if not selected_breed:
+    st.warning("No breed data found for the selected state. Please choose a different state.")
+    st.stop()
+
+breed_df = state_df[state_df["breed_primary"] == selected_breed]
+
+st.markdown("## 🧩 Will this breed get along with your household?")
+st.markdown("### Choose age, size, and sex to see how compatible these dogs are with children, cats, and dogs.")
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    selected_age = st.radio("Age", age_order, horizontal=True)
+with col2:
+    selected_sex = st.radio("Sex", sex_order, horizontal=True)
+with col3:
+    selected_size = st.radio("Size", size_order, horizontal=True)
+
+filtered = breed_df[
+    (breed_df["age"] == selected_age) &
+    (breed_df["sex"] == selected_sex) &
+    (breed_df["size"] == selected_size)
+]
+
+if filtered.empty:
+    st.info("No dogs found for the selected combination. Try adjusting age, size, or sex.")
 else:
-    st.warning("Please upload the dataset in the sidebar first.")
+    # Yes/No counts for all three traits from the packed compatibility bits
+    bits = filtered["env_bits"].to_numpy()
+    yes = [int(np.bitwise_and(bits, 1 << i).astype(bool).sum()) for i in range(3)]
+    no = [len(bits) - count for count in yes]
+
+    df_compat = pd.DataFrame({
+        "Response": ["Yes"] * 3 + ["No"] * 3,
+        "Count": yes + no,
+        "Trait": ["Children", "Dogs", "Cats"] * 2
+    })
+
+    state_label = selected_state if selected_state else "the US"
+
+    bar_chart = {
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "Trait", "type": "nominal", "title": None},
+            "y": {"field": "Count", "type": "quantitative", "title": "Number of Dogs"},
+            "color": {"field": "Response", "type": "nominal", "title": "Compatible", "scale": {"domain": ["Yes", "No"]}},
+            "tooltip": [
+                {"field": "Trait", "type": "nominal"},
+                {"field": "Response", "type": "nominal"},
+                {"field": "Count", "type": "quantitative"}
+            ]
+        },
+        "width": 400,
+        "height": 400,
+        "title": f"Compatibility for {selected_breed} in {state_label} ({selected_age}, {selected_sex}, {selected_size})"
+    }
+
+    st.vega_lite_chart(df_compat, bar_chart, width="stretch")
+
+    st.markdown(
+        "*Note: Each compatibility trait is recorded separately.*"
+    )
 
 
 